@@ -14,5 +14,9 @@ setup(
         "lxml==4.3.1",
         "requests==2.21",
         "progress==1.5",
-    ]
+    ],
+    extras_require={
+        "fast-json": ["orjson"],
+        "cache": ["requests-cache"],
+    }
 )
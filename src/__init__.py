@@ -4,21 +4,58 @@ import shutil
 import traceback
 import argparse
 import requests
-import lxml.html as html
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from enum import Enum
+from io import BytesIO
+from lxml import etree
 from progress.bar import Bar
+from requests.adapters import HTTPAdapter
 from typing import List, Union, Any, NewType
+from urllib.parse import urljoin
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import requests_cache
+except ImportError:
+    requests_cache = None
 
 PINTEREST_HOST = "https://pinterest.com"
 Response = requests.models.Response
 Session = requests.Session
 
 
+def json_loads(data: Union[str, bytes]) -> Any:
+    """
+    Decodes JSON with orjson when available, falling back to the standard library
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+
+    return json.loads(data)
+
+
+def json_dumps(obj: Any) -> str:
+    """
+    Encodes JSON with orjson when available, falling back to the standard library
+    """
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+
+    return json.dumps(obj)
+
+
 class UserBoardException(Exception):
     pass
 
 
 class Board:
+    __slots__ = ("id", "url", "owner", "name")
+
     id: str  # Board id
     url: str  # Board url e.g. username/board_name
     owner: str  # username
@@ -37,10 +74,20 @@ class DownloadableResourceType(Enum):
 
 
 class DownloadableResource:
+    __slots__ = ("type", "id", "url")
+
     type: NewType('DownloadableResourceType', DownloadableResourceType)
     id: str
     url: str  # url to image or video stream
 
+    def __init__(self,
+                 resource_type: DownloadableResourceType = None,
+                 resource_id: str = None,
+                 url: str = None):
+        self.type = resource_type
+        self.id = resource_id
+        self.url = url
+
 
 class UserProfileBaseResource:
     status: str
@@ -67,18 +114,25 @@ def user_profile_board_resource(data_items: List[Any]) -> List[Board]:
     if not isinstance(data_items, list):
         raise ValueError("Wrong object provided")
 
-    result = []
+    return [Board(board_id=i["id"], url=i["url"], owner=i["owner"]["username"], name=i["name"])
+            for i in data_items]
 
-    for i in data_items:
-        board = Board()
-        board.id = i["id"]
-        board.url = i["url"]
-        board.owner = i["owner"]["username"]
-        board.name = i["name"]
 
-        result.append(board)
+def _initial_state(page: bytes) -> str:
+    """
+    Extracts the initial-state JSON from a Pinterest page without building the full document tree
+    :param page: Raw page content
+    :return: JSON text of the initial-state script tag
+    """
+    # One-shot extraction: no need for the ID hash, comments or oversized-tree
+    # support, so turn them off to keep the parse lean
+    for _, element in etree.iterparse(BytesIO(page), html=True, events=("end",), tag="script",
+                                      collect_ids=False, huge_tree=False, remove_comments=True):
+        if element.get("id") == "initial-state":
+            return element.text
+        element.clear()
 
-    return result
+    raise ValueError("Page does not contain initial state")
 
 
 def get_page_data(path: str) -> 'UserProfileResources':
@@ -88,11 +142,8 @@ def get_page_data(path: str) -> 'UserProfileResources':
     :param path: Pinterest path e.g. username or username/board_name
     :return:
     """
-    s = session()
-    r = s.get("{}/{}/".format(PINTEREST_HOST, path))
-    root = html.fromstring(r.content)
-    tag = root.xpath("//script[@id='initial-state']")[0]
-    responses = json.loads(tag.text)["resourceResponses"]
+    r = _METADATA_SESSION.get("{}/{}/".format(PINTEREST_HOST, path))
+    responses = json_loads(_initial_state(r.content))["resourceResponses"]
 
     result = UserProfileResources()
 
@@ -142,52 +193,60 @@ def get_download_links(board: Board) -> List[DownloadableResource]:
     :param board: User board
     :return: List of downloadable resources
     """
-    s = session()
-    bookmark = None
-    resources = []
-
-    while bookmark != '-end-':
-        options = {
-            "board_id": board.id,
-            "page_size": 25,
-        }
-
-        if bookmark:
-            options.update({
-                "bookmarks": [bookmark],
-            })
-
-        r = s.get("{}/resource/BoardFeedResource/get/".format(PINTEREST_HOST), params={
-            "source_url": board.url,
-            "data": json.dumps({
-                "options": options,
-                "context": {},
-            }),
-        })
-
-        data = r.json()
-        resources += data["resource_response"]["data"]
-        bookmark = data["resource"]["options"]["bookmarks"][0]
-
+    s = _METADATA_SESSION
     originals: List[DownloadableResource] = []
-    for res in resources:
-        # Get original image url
-        if ("images" in res) and (res["videos"] is None):
-
-            image = DownloadableResource()
-            image.type = DownloadableResourceType.image
-            image.id = res["id"]
-            image.url = res["images"]["orig"]["url"]
+    seen_ids: set = set()
 
-            originals.append(image)
-        # Get video download url
-        if "videos" in res and (res["videos"] is not None):
-            video = DownloadableResource()
-            video.type = DownloadableResourceType.video
-            video.id = res["id"]
-            video.url = res["videos"]["video_list"]["V_HLSV4"]["url"]
+    endpoint = "{}/resource/BoardFeedResource/get/".format(PINTEREST_HOST)
+    options = {
+        "board_id": board.id,
+        "page_size": 25,
+    }
+    params = {
+        "source_url": board.url,
+        "data": json_dumps({
+            "options": options,
+            "context": {},
+        }),
+    }
 
-            originals.append(video)
+    # The next page cannot be requested before the current response yields its
+    # bookmark, so instead the next request is fired as soon as the bookmark is
+    # known and the current page is processed while it is in flight
+    with ThreadPoolExecutor(max_workers=1) as prefetch:
+        future = prefetch.submit(s.get, endpoint, params=dict(params))
+
+        while True:
+            data = json_loads(future.result().content)
+            bookmark = data["resource"]["options"]["bookmarks"][0]
+
+            if bookmark != '-end-':
+                options["bookmarks"] = [bookmark]
+                params["data"] = json_dumps({
+                    "options": options,
+                    "context": {},
+                })
+                future = prefetch.submit(s.get, endpoint, params=dict(params))
+
+            for res in data["resource_response"]["data"]:
+                # Feed pages can repeat pins across bookmarks, skip duplicates
+                if res["id"] in seen_ids:
+                    continue
+                seen_ids.add(res["id"])
+
+                # Get original image url
+                if ("images" in res) and (res["videos"] is None):
+                    originals.append(DownloadableResource(DownloadableResourceType.image,
+                                                          res["id"],
+                                                          res["images"]["orig"]["url"]))
+                # Get video download url
+                if "videos" in res and (res["videos"] is not None):
+                    originals.append(DownloadableResource(DownloadableResourceType.video,
+                                                          res["id"],
+                                                          res["videos"]["video_list"]["V_HLSV4"]["url"]))
+
+            if bookmark == '-end-':
+                break
 
     return originals
 
@@ -203,13 +262,28 @@ def fetch_image(url: str, save_path: str) -> None:
     save_path:
         Save location
     """
+    tmp_path = None
     try:
-        r = requests.get(url, stream=True)
-        with open(save_path, "wb") as f:
-            for chunk in r:
-                f.write(chunk)
+        with _DOWNLOAD_SESSION.get(url, stream=True) as r:
+            r.raise_for_status()
+            # Write through a raw descriptor to skip the buffered-file layer,
+            # binding os.write locally to avoid per-chunk attribute lookups.
+            # Download lands in a .part file first and is renamed into place
+            # atomically, so interrupted downloads never leave a partial file
+            # under the final name
+            tmp_path = f"{save_path}.part"
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+            write = os.write
+            try:
+                for chunk in r.iter_content(chunk_size=1 << 16):
+                    write(fd, chunk)
+            finally:
+                os.close(fd)
+            os.replace(tmp_path, save_path)
     except Exception as e:
         log(e, "[Download Image Exception]")
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
 
 def get_stream_urls(url: str) -> List:
@@ -217,35 +291,36 @@ def get_stream_urls(url: str) -> List:
     Picks a stream with best resolution from provided url
     Requests that playlist and returns list of streams
     """
-    r: Response = requests.get(url, stream=True)
+    r: Response = _DOWNLOAD_SESSION.get(url)
     best_quality: str = ""
 
-    line: bytes
-    for line in r.iter_lines():
-        decoded_url: str = line.decode("utf-8")
-
-        if (not decoded_url) or (not decoded_url.endswith("m3u8")):
+    line: str
+    for line in r.content.decode("utf-8").splitlines():
+        if (not line) or (not line.endswith("m3u8")):
             continue
 
-        best_quality = decoded_url
+        best_quality = line
 
-    splitted_url: list = url.split("/")
-    splitted_url[-1]: str = best_quality
-    url: str = "/".join(splitted_url)
+    # urljoin resolves relative playlist entries against the playlist URL and
+    # passes absolute ones through untouched
+    url: str = urljoin(url, best_quality)
 
-    streams: Response = requests.get(url, stream=True)
-    stream_urls: List = []
+    streams: Response = _DOWNLOAD_SESSION.get(url)
 
-    for line in streams.iter_lines():
-        decoded_url: str = line.decode("utf-8")
-        if (not decoded_url) or (not decoded_url.endswith("ts")):
-            continue
+    return [urljoin(url, line)
+            for line in streams.content.decode("utf-8").splitlines()
+            if line and line.endswith("ts")]
 
-        stream_url: list = url.split("/")
-        stream_url[-1] = decoded_url
-        stream_urls.append("/".join(stream_url))
 
-    return stream_urls
+def _fetch_segment(url: str, save_path: str) -> None:
+    """
+    Downloads a single stream segment
+    """
+    with _DOWNLOAD_SESSION.get(url, stream=True) as ts_stream:
+        ts_stream.raise_for_status()
+        ts_stream.raw.decode_content = True
+        with open(save_path, "wb") as f:
+            shutil.copyfileobj(ts_stream.raw, f, length=1 << 16)
 
 
 def fetch_video(playlist_url: str, save_path: str) -> None:
@@ -262,15 +337,64 @@ def fetch_video(playlist_url: str, save_path: str) -> None:
         Where video resource should be saved
 
     """
+    tmp_path = None
+    part_paths: List[str] = []
     try:
         streams: list = get_stream_urls(playlist_url)
-        url: str
-        for url in streams:
-            ts_stream: Response = requests.get(url, stream=True)
-            with open(save_path, "ab") as merged:
-                shutil.copyfileobj(ts_stream.raw, merged)
+
+        part_paths = [f"{save_path}.part{i}" for i in range(len(streams))]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = [executor.submit(_fetch_segment, url, part_path)
+                       for url, part_path in zip(streams, part_paths)]
+            for future in futures:
+                future.result()
+
+        # Concatenate segments in playlist order into a .part file, then
+        # rename it into place atomically so the final name never holds a
+        # partially merged video
+        tmp_path = f"{save_path}.part"
+        with open(tmp_path, "wb") as merged:
+            for part_path in part_paths:
+                with open(part_path, "rb") as part:
+                    shutil.copyfileobj(part, merged, length=1 << 16)
+                os.remove(part_path)
+        os.replace(tmp_path, save_path)
     except Exception as e:
         log(e, "[Download Video Exception]")
+        for part_path in part_paths:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _existing_files(directory: str) -> set:
+    """
+    Returns names of files already present in directory
+    """
+    with os.scandir(directory) as entries:
+        return {entry.name for entry in entries}
+
+
+def _download_one(resource: DownloadableResource,
+                  save_folder: str,
+                  existing_files: set,
+                  force_download: bool = False) -> None:
+    """
+    Downloads a single board resource into save_folder
+    """
+    # Download images
+    if resource.type is DownloadableResourceType.image:
+        ext = resource.url.rpartition(".")[2].split("?", 1)[0]
+        filename = f"{resource.id}.{ext}"
+        if filename not in existing_files or force_download:
+            fetch_image(resource.url, os.path.join(save_folder, filename))
+
+    # Download video
+    if resource.type is DownloadableResourceType.video:
+        filename = f"{resource.id}.ts"
+        if filename not in existing_files or force_download:
+            fetch_video(resource.url, os.path.join(save_folder, filename))
 
 
 def fetch_board(board_name: str,
@@ -296,35 +420,25 @@ def fetch_board(board_name: str,
         raise TypeError("Links has wrong type")
 
     print(f"Downloading {board_name}")
-    links_with_progress: List[DownloadableResource] = Bar("Progress").iter(links)
-
-    for resource in links_with_progress:
-        # Download images
-        if resource.type == DownloadableResourceType.image:
-            ext = resource.url.split(".")[-1]
-            filename = f"{resource.id}.{ext}"
-            save_path = os.path.join(save_folder, filename)
-            path_exists = os.path.exists(save_path)
-            if not path_exists or force_download:
-                make_dir(save_folder)
-                fetch_image(resource.url, save_path)
+    make_dir(save_folder)
+    existing_files = _existing_files(save_folder)
 
-        # Download video
-        if resource.type == DownloadableResourceType.video:
-            filename = f"{resource.id}.ts"
-            save_path = os.path.join(save_folder, filename)
-            path_exists = os.path.exists(save_path)
+    progress = Bar("Progress", max=len(links))
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        futures = [executor.submit(_download_one, resource, save_folder, existing_files, force_download)
+                   for resource in links]
+        for future in as_completed(futures):
+            future.result()
+            progress.next()
+    progress.finish()
 
-            if not path_exists or force_download:
-                make_dir(save_folder)
-                fetch_video(resource.url, save_path)
 
-
-def session() -> Session:
+def session(s: Session = None) -> Session:
     """
     Returns request session with pre-defined headers
     """
-    s = requests.Session()
+    if s is None:
+        s = requests.Session()
     s.headers = {
         "Referer": PINTEREST_HOST,
         "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/81.0.4044.138 "
@@ -334,15 +448,55 @@ def session() -> Session:
     return s
 
 
+def _pooled_session(s: Session = None) -> Session:
+    """
+    Returns a shared session with connection pooling and retries on transient errors
+    """
+    s = session(s)
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=32,
+        max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504]),
+    )
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+
+    return s
+
+
+_DOWNLOAD_SESSION = _pooled_session()
+
+
+def _metadata_session() -> Session:
+    """
+    Returns the session used for board metadata requests
+
+    When requests-cache is installed, responses are cached for up to an hour
+    and revalidated with ETag/If-None-Match once stale, so unchanged metadata
+    is served from disk instead of re-downloaded. Falls back to the shared
+    download session otherwise.
+    """
+    if requests_cache is None:
+        return _DOWNLOAD_SESSION
+
+    # Without expire_after, entries lacking Cache-Control/Expires headers
+    # would be cached forever and repeat runs would never see new pins
+    return _pooled_session(requests_cache.CachedSession("pin_dl_cache",
+                                                        cache_control=True,
+                                                        expire_after=3600))
+
+
+_METADATA_SESSION = _metadata_session()
+
+
 def response_has_errors(response_item):
     """
     Checks if response contains errors
     """
-    if "response" not in "response_item":
+    if "response" not in response_item:
         raise ValueError("Response item was not found")
 
-    if "error" in response_item["response"]:
-        return True
+    return "error" in response_item["response"]
 
 
 def response_error_message(response_item):
@@ -353,7 +507,7 @@ def response_error_message(response_item):
         raise ValueError("Response item does not have errors")
 
     error_object = response_item["response"]["error"]["message"].split(" - ")[1]
-    json_error = json.loads(error_object)
+    json_error = json_loads(error_object)
 
     return json_error["message"]
 
@@ -362,10 +516,7 @@ def make_dir(directory: str) -> None:
     """
     Creates directory if not exists
     """
-    try:
-        os.makedirs(directory)
-    except OSError:
-        pass
+    os.makedirs(directory, exist_ok=True)
 
 
 def log(e: Exception, header: str = None) -> None:
@@ -396,8 +547,11 @@ def main() -> None:
     try:
         boards = user_boards(args.path)
 
-        for board in boards:
-            links = get_download_links(board)
+        # Link pages for different boards are independent, fetch them concurrently
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            board_links = list(executor.map(get_download_links, boards))
+
+        for board, links in zip(boards, board_links):
             save_folder_name = os.path.join(args.save_folder, board.owner, board.name)
             fetch_board(board.name, links, save_folder_name, args.force)
 
@@ -1,7 +1,7 @@
 import os
 import sys
 import pytest
-from .__init__ import make_dir, log
+from .__init__ import make_dir, log, response_has_errors
 
 test_board = ""
 test_image = ""
@@ -40,6 +40,12 @@ def test_make_dir():
   make_dir(test_folder)
   assert os.path.exists(test_folder)
 
+def test_response_has_errors():
+  assert response_has_errors({"response": {"error": {}}})
+  assert not response_has_errors({"response": {}})
+  with pytest.raises(ValueError):
+    response_has_errors({})
+
 def test_log(capfd):
   try:
     raise ValueError("Testing log")